@@ -5,6 +5,7 @@ import pytest
 import torch
 
 from common_utils import (
+    CPU_ONLY,
     CUDA_NOT_AVAILABLE_MSG,
     IN_FBCODE,
     IN_OSS_CI,
@@ -43,6 +44,11 @@ def pytest_collection_modifyitems(items):
         needs_cuda = item.get_closest_marker("needs_cuda") is not None
         needs_mps = item.get_closest_marker("needs_mps") is not None
 
+        if needs_cuda and CPU_ONLY:
+            # CPU-only shards set TORCHVISION_TEST_CPU_ONLY=1. They don't collect the tests that need CUDA, even if the
+            # machine has a GPU.
+            continue
+
         if needs_cuda and not torch.cuda.is_available():
             # In general, we skip cuda tests on machines without a GPU
             # There are special cases though, see below
@@ -54,7 +60,7 @@ def pytest_collection_modifyitems(items):
         if IN_FBCODE:
             # fbcode doesn't like skipping tests, so instead we  just don't collect the test
             # so that they don't even "exist", hence the continue statements.
-            if not needs_cuda and IN_RE_WORKER:
+            if not needs_cuda and IN_RE_WORKER and not CPU_ONLY:
                 # The RE workers are the machines with GPU, we don't want them to run CPU-only tests.
                 continue
             if needs_cuda and not torch.cuda.is_available():
@@ -67,7 +73,7 @@ def pytest_collection_modifyitems(items):
                 continue
         elif IN_OSS_CI:
             # Here we're not in fbcode, so we can safely collect and skip tests.
-            if not needs_cuda and torch.cuda.is_available():
+            if not needs_cuda and torch.cuda.is_available() and not CPU_ONLY:
                 # Similar to what happens in RE workers: we don't need the OSS CI GPU machines
                 # to run the CPU-only tests.
                 item.add_marker(pytest.mark.skip(reason=OSS_CI_GPU_NO_CUDA_MSG))
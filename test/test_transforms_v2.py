@@ -1,5 +1,6 @@
+import functools
 import itertools
-import random
+from unittest import mock
 
 import numpy as np
 
@@ -10,22 +11,46 @@ import torchvision.transforms.v2 as transforms
 
 from common_utils import assert_equal, cpu_and_cuda
 from torchvision import tv_tensors
-from torchvision.ops.boxes import box_iou
-from torchvision.transforms.functional import to_pil_image
 from torchvision.transforms.v2._utils import is_pure_tensor
-from transforms_v2_legacy_utils import make_bounding_boxes, make_detection_mask, make_image, make_images, make_videos
+from transforms_v2_legacy_utils import (
+    make_bounding_boxes,
+    make_detection_mask,
+    make_image,
+    make_image_pil,
+    make_image_tensor,
+    make_video,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def make_cached_image(size):
+    # The returned image is shared between all callers. Thus, only use this for tests that don't modify the image.
+    return make_image(size)
+
+
+@functools.lru_cache(maxsize=None)
+def _make_spec_mock(spec):
+    return mock.MagicMock(spec=spec)
 
 
-def make_vanilla_tensor_images(*args, **kwargs):
-    for image in make_images(*args, **kwargs):
-        if image.ndim > 3:
-            continue
-        yield image.data
+def make_spec_mock(spec):
+    # Creating a mock with a spec walks all attributes of the spec, which is expensive for classes like torch.Tensor.
+    # Since the tests only pass the mock around as input, we share one mock per spec and just reset it before use.
+    spec_mock = _make_spec_mock(spec)
+    spec_mock.reset_mock()
+    return spec_mock
 
 
-def make_pil_images(*args, **kwargs):
-    for image in make_vanilla_tensor_images(*args, **kwargs):
-        yield to_pil_image(image)
+def record_calls(monkeypatch, target, return_value=None):
+    # Lightweight alternative to mocker.patch for tests that only need to know how the patched function was called
+    calls = []
+
+    def fn(*args, **kwargs):
+        calls.append((args, kwargs))
+        return return_value
+
+    monkeypatch.setattr(target, fn)
+    return calls
 
 
 def parametrize(transforms_with_inputs):
@@ -43,19 +68,30 @@ def parametrize(transforms_with_inputs):
     )
 
 
-@pytest.mark.parametrize(
-    "flat_inputs",
-    itertools.permutations(
+def make_pure_tensor_heuristic_inputs():
+    # The heuristic only depends on the positions of the pure tensors in the sample and on which image-like types are
+    # present besides them. Thus, we keep only one permutation for each combination of those rather than all of them.
+    # Keeping the types makes sure that each image-like type on its own is checked to block pure tensors.
+    inputs = {}
+    for flat_inputs in itertools.permutations(
         [
-            next(make_vanilla_tensor_images()),
-            next(make_vanilla_tensor_images()),
-            next(make_pil_images()),
+            make_image_tensor(),
+            make_image_tensor(),
+            make_image_pil(),
             make_image(),
-            next(make_videos()),
+            make_video(),
         ],
         3,
-    ),
-)
+    ):
+        key = (
+            tuple(is_pure_tensor(inpt) for inpt in flat_inputs),
+            frozenset(type(inpt) for inpt in flat_inputs if not is_pure_tensor(inpt)),
+        )
+        inputs.setdefault(key, flat_inputs)
+    return list(inputs.values())
+
+
+@pytest.mark.parametrize("flat_inputs", make_pure_tensor_heuristic_inputs())
 def test_pure_tensor_heuristic(flat_inputs):
     def split_on_pure_tensor(to_split):
         # This takes a sequence that is structurally aligned with `flat_inputs` and splits its items into three parts:
@@ -80,8 +116,13 @@ def test_pure_tensor_heuristic(flat_inputs):
             if identity:
                 return False
 
-            # Make sure nothing fishy is going on
-            assert_equal(output, inpt)
+            # Make sure nothing fishy is going on. Since the transform only clones its inputs, there is no need to compare
+            # the actual values.
+            assert type(output) is type(inpt)
+            if isinstance(inpt, PIL.Image.Image):
+                assert (output.size, output.mode) == (inpt.size, inpt.mode)
+            else:
+                assert output.shape == inpt.shape
             return True
 
     first_pure_tensor_input, other_pure_tensor_inputs, other_inputs = split_on_pure_tensor(flat_inputs)
@@ -109,10 +150,10 @@ class TestTransform:
         "inpt_type",
         [torch.Tensor, PIL.Image.Image, tv_tensors.Image, np.ndarray, tv_tensors.BoundingBoxes, str, int],
     )
-    def test_check_transformed_types(self, inpt_type, mocker):
+    def test_check_transformed_types(self, inpt_type):
         # This test ensures that we correctly handle which types to transform and which to bypass
         t = transforms.Transform()
-        inpt = mocker.MagicMock(spec=inpt_type)
+        inpt = make_spec_mock(inpt_type)
 
         if inpt_type in (np.ndarray, str, int):
             output = t(inpt)
@@ -122,24 +163,24 @@ class TestTransform:
                 t(inpt)
 
 
+TO_IMAGE_OUTPUT = torch.empty(1, 3, 8, 8)
+
+
 class TestToImage:
     @pytest.mark.parametrize(
         "inpt_type",
         [torch.Tensor, PIL.Image.Image, tv_tensors.Image, np.ndarray, tv_tensors.BoundingBoxes, str, int],
     )
-    def test__transform(self, inpt_type, mocker):
-        fn = mocker.patch(
-            "torchvision.transforms.v2.functional.to_image",
-            return_value=torch.rand(1, 3, 8, 8),
-        )
+    def test__transform(self, inpt_type, monkeypatch):
+        calls = record_calls(monkeypatch, "torchvision.transforms.v2.functional.to_image", return_value=TO_IMAGE_OUTPUT)
 
-        inpt = mocker.MagicMock(spec=inpt_type)
+        inpt = make_spec_mock(inpt_type)
         transform = transforms.ToImage()
         transform(inpt)
         if inpt_type in (tv_tensors.BoundingBoxes, tv_tensors.Image, str, int):
-            assert fn.call_count == 0
+            assert not calls
         else:
-            fn.assert_called_once_with(inpt)
+            assert calls == [((inpt,), {})]
 
 
 class TestToPILImage:
@@ -147,16 +188,16 @@ class TestToPILImage:
         "inpt_type",
         [torch.Tensor, PIL.Image.Image, tv_tensors.Image, np.ndarray, tv_tensors.BoundingBoxes, str, int],
     )
-    def test__transform(self, inpt_type, mocker):
-        fn = mocker.patch("torchvision.transforms.v2.functional.to_pil_image")
+    def test__transform(self, inpt_type, monkeypatch):
+        calls = record_calls(monkeypatch, "torchvision.transforms.v2.functional.to_pil_image")
 
-        inpt = mocker.MagicMock(spec=inpt_type)
+        inpt = make_spec_mock(inpt_type)
         transform = transforms.ToPILImage()
         transform(inpt)
         if inpt_type in (PIL.Image.Image, tv_tensors.BoundingBoxes, str, int):
-            assert fn.call_count == 0
+            assert not calls
         else:
-            fn.assert_called_once_with(inpt, mode=transform.mode)
+            assert calls == [((inpt,), dict(mode=transform.mode))]
 
 
 class TestToTensor:
@@ -164,17 +205,21 @@ class TestToTensor:
         "inpt_type",
         [torch.Tensor, PIL.Image.Image, tv_tensors.Image, np.ndarray, tv_tensors.BoundingBoxes, str, int],
     )
-    def test__transform(self, inpt_type, mocker):
-        fn = mocker.patch("torchvision.transforms.functional.to_tensor")
+    def test__transform(self, inpt_type, monkeypatch):
+        calls = record_calls(monkeypatch, "torchvision.transforms.functional.to_tensor")
 
-        inpt = mocker.MagicMock(spec=inpt_type)
+        inpt = make_spec_mock(inpt_type)
         with pytest.warns(UserWarning, match="deprecated and will be removed"):
             transform = transforms.ToTensor()
         transform(inpt)
         if inpt_type in (tv_tensors.Image, torch.Tensor, tv_tensors.BoundingBoxes, str, int):
-            assert fn.call_count == 0
+            assert not calls
         else:
-            fn.assert_called_once_with(inpt)
+            assert calls == [((inpt,), {})]
+
+
+# None of the transforms in TestContainers.test_ctor operate in-place. Thus, all parametrizations can share the input.
+CONTAINERS_CTOR_INPUT = torch.rand(1, 3, 32, 32)
 
 
 class TestContainers:
@@ -194,8 +239,7 @@ class TestContainers:
     )
     def test_ctor(self, transform_cls, trfms):
         c = transform_cls(trfms)
-        inpt = torch.rand(1, 3, 32, 32)
-        output = c(inpt)
+        output = c(CONTAINERS_CTOR_INPUT)
         assert isinstance(output, torch.Tensor)
         assert output.ndim == 4
 
@@ -206,12 +250,28 @@ class TestRandomChoice:
             transforms.RandomChoice([transforms.Pad(2), transforms.RandomCrop(28)], p=[1])
 
 
+def crop_iou(boxes, crop):
+    # Same as torchvision.ops.box_iou(boxes, torch.tensor([crop])).squeeze(1), but without the pairwise overhead. The
+    # boxes are expected as XYXY tensor and the crop as XYXY sequence of Python scalars, so it never needs to be moved to
+    # the device of the boxes.
+    left, top, right, bottom = crop
+    inter_w = (boxes[:, 2].clamp(max=right) - boxes[:, 0].clamp(min=left)).clamp_min_(0)
+    inter_h = (boxes[:, 3].clamp(max=bottom) - boxes[:, 1].clamp(min=top)).clamp_min_(0)
+    inter = inter_w * inter_h
+    boxes_area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    crop_area = (right - left) * (bottom - top)
+    return inter / (boxes_area + crop_area - inter)
+
+
 class TestRandomIoUCrop:
     @pytest.mark.parametrize("device", cpu_and_cuda())
     @pytest.mark.parametrize("options", [[0.5, 0.9], [2.0]])
     def test__get_params(self, device, options):
+        if options == [2.0] and device == "cuda":
+            pytest.skip("The leave-as-is option returns before any device specific computation happens")
+
         orig_h, orig_w = size = (24, 32)
-        image = make_image(size)
+        image = make_cached_image(size)
         bboxes = tv_tensors.BoundingBoxes(
             torch.tensor([[1, 1, 10, 10], [20, 20, 23, 23], [1, 20, 10, 23], [20, 1, 23, 10]]),
             format="XYXY",
@@ -239,10 +299,7 @@ class TestRandomIoUCrop:
 
             left, top = params["left"], params["top"]
             new_h, new_w = params["height"], params["width"]
-            ious = box_iou(
-                bboxes,
-                torch.tensor([[left, top, left + new_w, top + new_h]], dtype=bboxes.dtype, device=bboxes.device),
-            )
+            ious = crop_iou(bboxes.as_subclass(torch.Tensor), (left, top, left + new_w, top + new_h))
             assert ious.max() >= options[0] or ious.max() >= options[1], f"{ious} vs {options}"
 
     def test__transform_empty_params(self, mocker):
@@ -296,7 +353,7 @@ class TestRandomShortestSize:
 
         transform = transforms.RandomShortestSize(min_size=min_size, max_size=max_size, antialias=True)
 
-        sample = make_image(canvas_size)
+        sample = make_cached_image(canvas_size)
         params = transform._get_params([sample])
 
         assert "size" in params
@@ -329,36 +386,23 @@ class TestRandomResize:
             assert min_size <= size < max_size
 
 
-@pytest.mark.parametrize("image_type", (PIL.Image, torch.Tensor, tv_tensors.Image))
-@pytest.mark.parametrize("label_type", (torch.Tensor, int))
-@pytest.mark.parametrize("dataset_return_type", (dict, tuple))
-@pytest.mark.parametrize("to_tensor", (transforms.ToTensor, transforms.ToImage))
-def test_classif_preset(image_type, label_type, dataset_return_type, to_tensor):
-
-    image = tv_tensors.Image(torch.randint(0, 256, size=(1, 3, 250, 250), dtype=torch.uint8))
-    if image_type is PIL.Image:
-        image = to_pil_image(image[0])
-    elif image_type is torch.Tensor:
-        image = image.as_subclass(torch.Tensor)
-        assert is_pure_tensor(image)
+# The pixel values are irrelevant for the preset tests. Thus, we sample the images only once and share them between all
+# parametrizations. This is safe, since none of the transforms operates in-place.
+CLASSIF_PRESET_IMAGE = torch.randint(0, 256, size=(1, 3, 250, 250), dtype=torch.uint8)
+CLASSIF_PRESET_IMAGE_PIL = PIL.Image.fromarray(CLASSIF_PRESET_IMAGE[0].permute(1, 2, 0).numpy())
 
-    label = 1 if label_type is int else torch.tensor([1])
 
-    if dataset_return_type is dict:
-        sample = {
-            "image": image,
-            "label": label,
-        }
-    else:
-        sample = image, label
-
-    if to_tensor is transforms.ToTensor:
+@functools.lru_cache(maxsize=None)
+def make_classif_preset(to_tensor_cls):
+    # The transforms don't hold any state between calls. Thus, we only build the pipeline once per tensor conversion
+    # and share it between all parametrizations.
+    if to_tensor_cls is transforms.ToTensor:
         with pytest.warns(UserWarning, match="deprecated and will be removed"):
-            to_tensor = to_tensor()
+            to_tensor = to_tensor_cls()
     else:
-        to_tensor = to_tensor()
+        to_tensor = to_tensor_cls()
 
-    t = transforms.Compose(
+    return transforms.Compose(
         [
             transforms.RandomResizedCrop((224, 224), antialias=True),
             transforms.RandomHorizontalFlip(p=1),
@@ -377,6 +421,41 @@ def test_classif_preset(image_type, label_type, dataset_return_type, to_tensor):
         ]
     )
 
+
+@pytest.mark.parametrize("image_type", (PIL.Image, torch.Tensor, tv_tensors.Image))
+@pytest.mark.parametrize("label_type", (torch.Tensor, int))
+@pytest.mark.parametrize("dataset_return_type", (dict, tuple))
+@pytest.mark.parametrize("to_tensor", (transforms.ToTensor, transforms.ToImage))
+@pytest.mark.parametrize("device", cpu_and_cuda())
+def test_classif_preset(image_type, label_type, dataset_return_type, to_tensor, device):
+    if image_type is PIL.Image:
+        if device != "cpu":
+            pytest.skip("PIL images can only be processed on the CPU")
+        # The PIL path is an order of magnitude slower than the tensor one. Since the other parameters are independent
+        # of the image type, we only run it for a single combination of them.
+        if not (label_type is torch.Tensor and dataset_return_type is dict and to_tensor is transforms.ToImage):
+            pytest.skip("PIL images are only tested for a single parametrization")
+
+    image = CLASSIF_PRESET_IMAGE.to(device)
+    if image_type is PIL.Image:
+        image = CLASSIF_PRESET_IMAGE_PIL
+    elif image_type is tv_tensors.Image:
+        image = tv_tensors.Image(image)
+    else:
+        assert is_pure_tensor(image)
+
+    label = 1 if label_type is int else torch.tensor([1])
+
+    if dataset_return_type is dict:
+        sample = {
+            "image": image,
+            "label": label,
+        }
+    else:
+        sample = image, label
+
+    t = make_classif_preset(to_tensor)
+
     out = t(sample)
 
     assert type(out) == type(sample)
@@ -391,12 +470,45 @@ def test_classif_preset(image_type, label_type, dataset_return_type, to_tensor):
     assert out_label == label
 
 
+def make_detection_preset_inputs(num_boxes=5, size=(250, 250)):
+    # The expected number of boxes in test_detection_preset depends on the random state after sampling the inputs. Thus,
+    # we sample them with a dedicated generator seeded the same way the test seeds the global one, and let the test
+    # continue from the generator state afterwards.
+    generator = torch.Generator().manual_seed(0)
+
+    image = torch.randint(0, 256, size=(1, 3, *size), dtype=torch.uint8, generator=generator)
+    image_pil = PIL.Image.fromarray(image[0].permute(1, 2, 0).numpy())
+
+    label = torch.randint(0, 10, size=(num_boxes,), generator=generator)
+
+    boxes = torch.randint(0, min(size) // 2, size=(num_boxes, 4), generator=generator)
+    boxes[:, 2:] += boxes[:, :2]
+    boxes = boxes.clamp(min=0, max=min(size))
+    boxes = tv_tensors.BoundingBoxes(boxes, format="XYXY", canvas_size=size)
+
+    masks = tv_tensors.Mask(torch.randint(0, 2, size=(num_boxes, *size), dtype=torch.uint8, generator=generator))
+
+    return dict(image=image, image_pil=image_pil, label=label, boxes=boxes, masks=masks), generator.get_state()
+
+
+DETECTION_PRESET_INPUTS, DETECTION_PRESET_RNG_STATE = make_detection_preset_inputs()
+
+
 @pytest.mark.parametrize("image_type", (PIL.Image, torch.Tensor, tv_tensors.Image))
 @pytest.mark.parametrize("data_augmentation", ("hflip", "lsj", "multiscale", "ssd", "ssdlite"))
 @pytest.mark.parametrize("to_tensor", (transforms.ToTensor, transforms.ToImage))
 @pytest.mark.parametrize("sanitize", (True, False))
-def test_detection_preset(image_type, data_augmentation, to_tensor, sanitize):
-    torch.manual_seed(0)
+@pytest.mark.parametrize("device", cpu_and_cuda())
+def test_detection_preset(image_type, data_augmentation, to_tensor, sanitize, device):
+    if image_type is PIL.Image:
+        if device != "cpu":
+            pytest.skip("PIL images can only be processed on the CPU")
+        # The PIL path is an order of magnitude slower than the tensor one. Thus, we only run it once per augmentation
+        # pipeline.
+        if not (to_tensor is transforms.ToImage and sanitize):
+            pytest.skip("PIL images are only tested once per augmentation pipeline")
+
+    torch.set_rng_state(DETECTION_PRESET_RNG_STATE)
 
     if to_tensor is transforms.ToTensor:
         with pytest.warns(UserWarning, match="deprecated and will be removed"):
@@ -453,24 +565,24 @@ def test_detection_preset(image_type, data_augmentation, to_tensor, sanitize):
         t += [transforms.SanitizeBoundingBoxes()]
     t = transforms.Compose(t)
 
-    num_boxes = 5
-    H = W = 250
-
-    image = tv_tensors.Image(torch.randint(0, 256, size=(1, 3, H, W), dtype=torch.uint8))
+    image = DETECTION_PRESET_INPUTS["image"]
     if image_type is PIL.Image:
-        image = to_pil_image(image[0])
-    elif image_type is torch.Tensor:
-        image = image.as_subclass(torch.Tensor)
+        image = DETECTION_PRESET_INPUTS["image_pil"]
+    elif image_type is tv_tensors.Image:
+        image = tv_tensors.Image(image)
+    else:
         assert is_pure_tensor(image)
 
-    label = torch.randint(0, 10, size=(num_boxes,))
-
-    boxes = torch.randint(0, min(H, W) // 2, size=(num_boxes, 4))
-    boxes[:, 2:] += boxes[:, :2]
-    boxes = boxes.clamp(min=0, max=min(H, W))
-    boxes = tv_tensors.BoundingBoxes(boxes, format="XYXY", canvas_size=(H, W))
+    label = DETECTION_PRESET_INPUTS["label"]
+    boxes = DETECTION_PRESET_INPUTS["boxes"]
+    masks = DETECTION_PRESET_INPUTS["masks"]
+    num_boxes = boxes.shape[0]
 
-    masks = tv_tensors.Mask(torch.randint(0, 2, size=(num_boxes, H, W), dtype=torch.uint8))
+    # The inputs are sampled on the CPU and only moved here to keep the expected number of boxes below independent of the
+    # device.
+    if image_type is not PIL.Image:
+        image = image.to(device)
+    label, boxes, masks = label.to(device), boxes.to(device), masks.to(device)
 
     sample = {
         "image": image,
@@ -531,13 +643,15 @@ def test_sanitize_bounding_boxes(min_size, labels_getter, sample_type):
         ([0, 0, 10, 10], True),
         ([1, 1, 30, 20], True),
     ]
+    boxes = torch.tensor([box for box, _ in boxes_and_validity])
+    is_valid = torch.tensor([valid for _, valid in boxes_and_validity])
 
-    random.shuffle(boxes_and_validity)  # For test robustness: mix order of wrong and correct cases
-    boxes, is_valid_mask = zip(*boxes_and_validity)
-    valid_indices = [i for (i, is_valid) in enumerate(is_valid_mask) if is_valid]
+    # For test robustness: mix order of wrong and correct cases. The permutation is seeded to keep failures reproducible.
+    perm = torch.randperm(boxes.shape[0], generator=torch.Generator().manual_seed(0))
+    boxes, is_valid = boxes[perm], is_valid[perm]
 
-    boxes = torch.tensor(boxes)
     labels = torch.arange(boxes.shape[0])
+    valid_indices = labels[is_valid]
 
     boxes = tv_tensors.BoundingBoxes(
         boxes,
@@ -588,7 +702,7 @@ def test_sanitize_bounding_boxes(min_size, labels_getter, sample_type):
         assert isinstance(out_labels, torch.Tensor)
         assert out_boxes.shape[0] == out_labels.shape[0] == out_masks.shape[0]
         # This works because we conveniently set labels to arange(num_boxes)
-        assert out_labels.tolist() == valid_indices
+        assert_equal(out_labels, valid_indices)
 
 
 def test_sanitize_bounding_boxes_no_label():
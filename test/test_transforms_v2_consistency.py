@@ -1,16 +1,19 @@
+import dataclasses
+import functools
 import importlib.machinery
 import importlib.util
 import inspect
 import random
 import re
 from pathlib import Path
+from typing import Any, Dict, Sequence
 
 import numpy as np
 import pytest
 
 import torch
 import torchvision.transforms.v2 as v2_transforms
-from common_utils import assert_close, assert_equal, set_rng_seed
+from common_utils import assert_close, assert_equal, freeze_rng_state, set_rng_seed
 from torch import nn
 from torchvision import transforms as legacy_transforms, tv_tensors
 from torchvision._utils import sequence_to_str
@@ -37,6 +40,19 @@ def fix_rng_seed():
     yield
 
 
+_CACHED_IMAGES = {}
+
+
+def make_cached_images(**kwargs):
+    # The images are shared between all tests with the same kwargs. Thus, transforms must not modify them in-place.
+    key = tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(kwargs.items()))
+    if key not in _CACHED_IMAGES:
+        with freeze_rng_state():
+            torch.manual_seed(0)
+            _CACHED_IMAGES[key] = tuple(make_images(**kwargs))
+    return _CACHED_IMAGES[key]
+
+
 class NotScriptableArgsKwargs(ArgsKwargs):
     """
     This class is used to mark parameters that render the transform non-scriptable. They still work in eager mode and
@@ -46,30 +62,17 @@ class NotScriptableArgsKwargs(ArgsKwargs):
     pass
 
 
+@dataclasses.dataclass(frozen=True)
 class ConsistencyConfig:
-    def __init__(
-        self,
-        prototype_cls,
-        legacy_cls,
-        # If no args_kwargs is passed, only the signature will be checked
-        args_kwargs=(),
-        make_images_kwargs=None,
-        supports_pil=True,
-        removed_params=(),
-        closeness_kwargs=None,
-    ):
-        self.prototype_cls = prototype_cls
-        self.legacy_cls = legacy_cls
-        self.args_kwargs = args_kwargs
-        self.make_images_kwargs = make_images_kwargs or DEFAULT_MAKE_IMAGES_KWARGS
-        self.supports_pil = supports_pil
-        self.removed_params = removed_params
-        self.closeness_kwargs = closeness_kwargs or dict(rtol=0, atol=0)
-
-
-# These are here since both the prototype and legacy transform need to be constructed with the same random parameters
-LINEAR_TRANSFORMATION_MEAN = torch.rand(36)
-LINEAR_TRANSFORMATION_MATRIX = torch.rand([LINEAR_TRANSFORMATION_MEAN.numel()] * 2)
+    prototype_cls: type
+    legacy_cls: type
+    # If no args_kwargs is passed, only the signature will be checked
+    args_kwargs: Sequence[ArgsKwargs] = ()
+    make_images_kwargs: Dict[str, Any] = dataclasses.field(default_factory=lambda: DEFAULT_MAKE_IMAGES_KWARGS)
+    supports_pil: bool = True
+    removed_params: Sequence[str] = ()
+    closeness_kwargs: Dict[str, Any] = dataclasses.field(default_factory=lambda: dict(rtol=0, atol=0))
+
 
 CONSISTENCY_CONFIGS = [
     ConsistencyConfig(
@@ -124,15 +127,24 @@ CONSISTENCY_CONFIGS = [
 ]
 
 
+@functools.lru_cache(maxsize=None)
+def get_signature_params(obj):
+    # Returned as tuple of (name, parameter) pairs, so callers can't modify the cached value
+    return tuple(inspect.signature(obj).parameters.items())
+
+
+@functools.lru_cache(maxsize=None)
+def get_signature_param_names(obj, removed_params=()):
+    return frozenset(name for name, _ in get_signature_params(obj)).difference(removed_params)
+
+
 @pytest.mark.parametrize("config", CONSISTENCY_CONFIGS, ids=lambda config: config.legacy_cls.__name__)
 def test_signature_consistency(config):
-    legacy_params = dict(inspect.signature(config.legacy_cls).parameters)
-    prototype_params = dict(inspect.signature(config.prototype_cls).parameters)
-
-    for param in config.removed_params:
-        legacy_params.pop(param, None)
+    legacy_names = get_signature_param_names(config.legacy_cls, tuple(config.removed_params))
+    prototype_names = get_signature_param_names(config.prototype_cls)
+    prototype_params = dict(get_signature_params(config.prototype_cls))
 
-    missing = legacy_params.keys() - prototype_params.keys()
+    missing = legacy_names - prototype_names
     if missing:
         raise AssertionError(
             f"The prototype transform does not support the parameters "
@@ -141,7 +153,7 @@ def test_signature_consistency(config):
             f"the `ConsistencyConfig`."
         )
 
-    extra = prototype_params.keys() - legacy_params.keys()
+    extra = prototype_names - legacy_names
     extra_without_default = {
         param
         for param in extra
@@ -155,7 +167,7 @@ def test_signature_consistency(config):
             f"not. Please add a default value."
         )
 
-    legacy_signature = list(legacy_params.keys())
+    legacy_signature = [name for name, _ in get_signature_params(config.legacy_cls) if name in legacy_names]
     # Since we made sure that we don't have any extra parameters without default above, we clamp the prototype signature
     # to the same number of parameters as the legacy one
     prototype_signature = list(prototype_params.keys())[: len(legacy_signature)]
@@ -163,91 +175,113 @@ def test_signature_consistency(config):
     assert prototype_signature == legacy_signature
 
 
+def seed_cpu_rng(seed):
+    # All inputs of the consistency checks live on the CPU. Thus, we only seed the CPU RNG rather than all devices like
+    # torch.manual_seed does.
+    torch.default_generator.manual_seed(seed)
+
+
+def image_repr(image):
+    # Only needed for the error messages below, so it is only computed on failure
+    return f"[{tuple(image.shape)}, {str(image.dtype).rsplit('.')[-1]}]"
+
+
 def check_call_consistency(
     prototype_transform, legacy_transform, images=None, supports_pil=True, closeness_kwargs=None
 ):
     if images is None:
-        images = make_images(**DEFAULT_MAKE_IMAGES_KWARGS)
+        images = make_cached_images(**DEFAULT_MAKE_IMAGES_KWARGS)
 
     closeness_kwargs = closeness_kwargs or dict()
 
-    for image in images:
-        image_repr = f"[{tuple(image.shape)}, {str(image.dtype).rsplit('.')[-1]}]"
+    # The outputs are collected and compared all at once after the loop. On failure, the message includes the index of
+    # the offending image.
+    prototype_tensor_outputs, legacy_tensor_outputs = [], []
+    prototype_image_outputs, prototype_image_expected_outputs = [], []
+    prototype_pil_outputs, legacy_pil_outputs = [], []
 
-        image_tensor = torch.Tensor(image)
+    for image in images:
+        image_tensor = image.as_subclass(torch.Tensor)
         try:
-            torch.manual_seed(0)
+            seed_cpu_rng(0)
             output_legacy_tensor = legacy_transform(image_tensor)
         except Exception as exc:
             raise pytest.UsageError(
-                f"Transforming a tensor image {image_repr} failed in the legacy transform with the "
+                f"Transforming a tensor image {image_repr(image)} failed in the legacy transform with the "
                 f"error above. This means that you need to specify the parameters passed to `make_images` through the "
                 "`make_images_kwargs` of the `ConsistencyConfig`."
             ) from exc
 
         try:
-            torch.manual_seed(0)
+            seed_cpu_rng(0)
             output_prototype_tensor = prototype_transform(image_tensor)
         except Exception as exc:
             raise AssertionError(
-                f"Transforming a tensor image with shape {image_repr} failed in the prototype transform with "
+                f"Transforming a tensor image with shape {image_repr(image)} failed in the prototype transform with "
                 f"the error above. This means there is a consistency bug either in `_get_params` or in the "
                 f"`is_pure_tensor` path in `_transform`."
             ) from exc
 
-        assert_close(
-            output_prototype_tensor,
-            output_legacy_tensor,
-            msg=lambda msg: f"Tensor image consistency check failed with: \n\n{msg}",
-            **closeness_kwargs,
-        )
+        prototype_tensor_outputs.append(output_prototype_tensor)
+        legacy_tensor_outputs.append(output_legacy_tensor)
 
         try:
-            torch.manual_seed(0)
+            seed_cpu_rng(0)
             output_prototype_image = prototype_transform(image)
         except Exception as exc:
             raise AssertionError(
-                f"Transforming a image tv_tensor with shape {image_repr} failed in the prototype transform with "
+                f"Transforming a image tv_tensor with shape {image_repr(image)} failed in the prototype transform with "
                 f"the error above. This means there is a consistency bug either in `_get_params` or in the "
                 f"`tv_tensors.Image` path in `_transform`."
             ) from exc
 
-        assert_close(
-            output_prototype_image,
-            output_prototype_tensor,
-            msg=lambda msg: f"Output for tv_tensor and tensor images is not equal: \n\n{msg}",
-            **closeness_kwargs,
-        )
+        prototype_image_outputs.append(output_prototype_image)
+        prototype_image_expected_outputs.append(output_prototype_tensor)
 
         if image.ndim == 3 and supports_pil:
             image_pil = to_pil_image(image)
 
             try:
-                torch.manual_seed(0)
+                seed_cpu_rng(0)
                 output_legacy_pil = legacy_transform(image_pil)
             except Exception as exc:
                 raise pytest.UsageError(
-                    f"Transforming a PIL image with shape {image_repr} failed in the legacy transform with the "
+                    f"Transforming a PIL image with shape {image_repr(image)} failed in the legacy transform with the "
                     f"error above. If this transform does not support PIL images, set `supports_pil=False` on the "
                     "`ConsistencyConfig`. "
                 ) from exc
 
             try:
-                torch.manual_seed(0)
+                seed_cpu_rng(0)
                 output_prototype_pil = prototype_transform(image_pil)
             except Exception as exc:
                 raise AssertionError(
-                    f"Transforming a PIL image with shape {image_repr} failed in the prototype transform with "
+                    f"Transforming a PIL image with shape {image_repr(image)} failed in the prototype transform with "
                     f"the error above. This means there is a consistency bug either in `_get_params` or in the "
                     f"`PIL.Image.Image` path in `_transform`."
                 ) from exc
 
-            assert_close(
-                output_prototype_pil,
-                output_legacy_pil,
-                msg=lambda msg: f"PIL image consistency check failed with: \n\n{msg}",
-                **closeness_kwargs,
-            )
+            prototype_pil_outputs.append(output_prototype_pil)
+            legacy_pil_outputs.append(output_legacy_pil)
+
+    assert_close(
+        prototype_tensor_outputs,
+        legacy_tensor_outputs,
+        msg=lambda msg: f"Tensor image consistency check failed with: \n\n{msg}",
+        **closeness_kwargs,
+    )
+    assert_close(
+        prototype_image_outputs,
+        prototype_image_expected_outputs,
+        msg=lambda msg: f"Output for tv_tensor and tensor images is not equal: \n\n{msg}",
+        **closeness_kwargs,
+    )
+    assert_close(
+        prototype_pil_outputs,
+        legacy_pil_outputs,
+        msg=lambda msg: f"PIL image consistency check failed with: \n\n{msg}",
+        **closeness_kwargs,
+    )
 
 
 @pytest.mark.parametrize(
@@ -283,7 +317,7 @@ def test_call_consistency(config, args_kwargs):
     check_call_consistency(
         prototype_transform,
         legacy_transform,
-        images=make_images(**config.make_images_kwargs),
+        images=make_cached_images(**config.make_images_kwargs),
         supports_pil=config.supports_pil,
         closeness_kwargs=config.closeness_kwargs,
     )
@@ -309,13 +343,13 @@ def test_jit_consistency(config, args_kwargs):
     legacy_transform_scripted = torch.jit.script(legacy_transform_eager)
     prototype_transform_scripted = torch.jit.script(prototype_transform_eager)
 
-    for image in make_images(**config.make_images_kwargs):
+    for image in make_cached_images(**config.make_images_kwargs):
         image = image.as_subclass(torch.Tensor)
 
-        torch.manual_seed(0)
+        seed_cpu_rng(0)
         output_legacy_scripted = legacy_transform_scripted(image)
 
-        torch.manual_seed(0)
+        seed_cpu_rng(0)
         output_prototype_scripted = prototype_transform_scripted(image)
 
         assert_close(output_prototype_scripted, output_legacy_scripted, **config.closeness_kwargs)
@@ -372,10 +406,20 @@ class TestContainerTransforms:
         # atol=1 due to Resize v2 is using native uint8 interpolate path for bilinear and nearest modes
         check_call_consistency(prototype_transform, legacy_transform, closeness_kwargs=dict(rtol=0, atol=1))
 
-        if sequence_type is nn.ModuleList:
-            # quick and dirty test that it is jit-scriptable
-            scripted = torch.jit.script(prototype_transform)
-            scripted(torch.rand(1, 3, 300, 300))
+    def test_random_apply_scriptable(self):
+        # quick and dirty test that it is jit-scriptable. Since the scripted structure doesn't depend on `p`, there is no
+        # need to script it for every `p` tested above.
+        prototype_transform = v2_transforms.RandomApply(
+            nn.ModuleList(
+                [
+                    v2_transforms.Resize(256),
+                    v2_transforms.CenterCrop(224),
+                ]
+            ),
+            p=0.5,
+        )
+        scripted = torch.jit.script(prototype_transform)
+        scripted(torch.rand(1, 3, 300, 300))
 
     # We can't test other values for `p` since the random parameter generation is different
     @pytest.mark.parametrize("probabilities", [(0, 1), (1, 0)])
@@ -435,88 +479,103 @@ def import_transforms_from_references(reference):
     return module
 
 
-det_transforms = import_transforms_from_references("detection")
+# The reference modules are only imported if one of their tests is actually run. Thus, the parametrizations below take
+# functions that build the reference transform from the module rather than the reference transform itself.
+@pytest.fixture(scope="module")
+def det_transforms():
+    return import_transforms_from_references("detection")
 
 
 class TestRefDetTransforms:
-    def make_tv_tensors(self, with_mask=True):
+    @pytest.fixture(scope="class")
+    def detection_data(self):
         size = (600, 800)
         num_objects = 22
 
-        def make_label(extra_dims, categories):
-            return torch.randint(categories, extra_dims, dtype=torch.int64)
-
-        pil_image = to_pil_image(make_image(size=size, color_space="RGB"))
-        target = {
-            "boxes": make_bounding_boxes(canvas_size=size, format="XYXY", batch_dims=(num_objects,), dtype=torch.float),
-            "labels": make_label(extra_dims=(num_objects,), categories=80),
-        }
-        if with_mask:
-            target["masks"] = make_detection_mask(size=size, num_objects=num_objects, dtype=torch.long)
-
-        yield (pil_image, target)
-
-        tensor_image = torch.Tensor(make_image(size=size, color_space="RGB", dtype=torch.float32))
-        target = {
-            "boxes": make_bounding_boxes(canvas_size=size, format="XYXY", batch_dims=(num_objects,), dtype=torch.float),
-            "labels": make_label(extra_dims=(num_objects,), categories=80),
-        }
-        if with_mask:
-            target["masks"] = make_detection_mask(size=size, num_objects=num_objects, dtype=torch.long)
-
-        yield (tensor_image, target)
-
-        tv_tensor_image = make_image(size=size, color_space="RGB", dtype=torch.float32)
-        target = {
-            "boxes": make_bounding_boxes(canvas_size=size, format="XYXY", batch_dims=(num_objects,), dtype=torch.float),
-            "labels": make_label(extra_dims=(num_objects,), categories=80),
-        }
-        if with_mask:
-            target["masks"] = make_detection_mask(size=size, num_objects=num_objects, dtype=torch.long)
-
-        yield (tv_tensor_image, target)
+        # Class-scoped fixtures are set up before the autouse seeding. Thus, we seed here to get the same data regardless
+        # of which tests are selected.
+        with freeze_rng_state():
+            torch.manual_seed(0)
+            image = make_image(size=size, color_space="RGB", dtype=torch.float32)
+            target = {
+                "boxes": make_bounding_boxes(
+                    canvas_size=size, format="XYXY", batch_dims=(num_objects,), dtype=torch.float
+                ),
+                "labels": torch.randint(80, (num_objects,), dtype=torch.int64),
+                "masks": make_detection_mask(size=size, num_objects=num_objects, dtype=torch.long),
+            }
+        return image, target
+
+    @pytest.fixture(params=["pil", "tensor", "tv_tensor"])
+    def detection_sample(self, request, detection_data, with_mask):
+        image, target = detection_data
+        if not with_mask:
+            target = {key: value for key, value in target.items() if key != "masks"}
+        if request.param == "pil":
+            image = to_pil_image(image)
+        elif request.param == "tensor":
+            image = image.as_subclass(torch.Tensor)
+
+        # The reference transforms update the target in-place. Thus, each test needs its own copy.
+        return image, {key: value.clone() for key, value in target.items()}
 
     @pytest.mark.parametrize(
-        "t_ref, t, data_kwargs",
+        "make_t_ref, t, with_mask",
         [
-            (det_transforms.RandomHorizontalFlip(p=1.0), v2_transforms.RandomHorizontalFlip(p=1.0), {}),
-            (
-                det_transforms.RandomIoUCrop(),
+            pytest.param(
+                lambda ref: ref.RandomHorizontalFlip(p=1.0),
+                v2_transforms.RandomHorizontalFlip(p=1.0),
+                True,
+                id="RandomHorizontalFlip",
+            ),
+            pytest.param(
+                lambda ref: ref.RandomIoUCrop(),
                 v2_transforms.Compose(
                     [
                         v2_transforms.RandomIoUCrop(),
                         v2_transforms.SanitizeBoundingBoxes(labels_getter=lambda sample: sample[1]["labels"]),
                     ]
                 ),
-                {"with_mask": False},
+                False,
+                id="RandomIoUCrop",
+            ),
+            pytest.param(lambda ref: ref.RandomZoomOut(), v2_transforms.RandomZoomOut(), False, id="RandomZoomOut"),
+            pytest.param(
+                lambda ref: ref.ScaleJitter((1024, 1024)),
+                v2_transforms.ScaleJitter((1024, 1024), antialias=True),
+                True,
+                id="ScaleJitter",
             ),
-            (det_transforms.RandomZoomOut(), v2_transforms.RandomZoomOut(), {"with_mask": False}),
-            (det_transforms.ScaleJitter((1024, 1024)), v2_transforms.ScaleJitter((1024, 1024), antialias=True), {}),
-            (
-                det_transforms.RandomShortestSize(
+            pytest.param(
+                lambda ref: ref.RandomShortestSize(
                     min_size=(480, 512, 544, 576, 608, 640, 672, 704, 736, 768, 800), max_size=1333
                 ),
                 v2_transforms.RandomShortestSize(
                     min_size=(480, 512, 544, 576, 608, 640, 672, 704, 736, 768, 800), max_size=1333
                 ),
-                {},
+                True,
+                id="RandomShortestSize",
             ),
         ],
     )
-    def test_transform(self, t_ref, t, data_kwargs):
-        for dp in self.make_tv_tensors(**data_kwargs):
+    def test_transform(self, det_transforms, make_t_ref, t, detection_sample):
+        t_ref = make_t_ref(det_transforms)
 
-            # We should use prototype transform first as reference transform performs inplace target update
-            torch.manual_seed(12)
-            output = t(dp)
+        dp = detection_sample
 
-            torch.manual_seed(12)
-            expected_output = t_ref(*dp)
+        # We should use prototype transform first as reference transform performs inplace target update
+        torch.manual_seed(12)
+        output = t(dp)
 
-            assert_equal(expected_output, output)
+        torch.manual_seed(12)
+        expected_output = t_ref(*dp)
 
+        assert_equal(expected_output, output)
 
-seg_transforms = import_transforms_from_references("segmentation")
+
+@pytest.fixture(scope="module")
+def seg_transforms():
+    return import_transforms_from_references("segmentation")
 
 
 # We need this transform for two reasons:
@@ -531,8 +590,8 @@ class PadIfSmaller(v2_transforms.Transform):
 
     def _get_params(self, sample):
         height, width = query_size(sample)
-        padding = [0, 0, max(self.size - width, 0), max(self.size - height, 0)]
-        needs_padding = any(padding)
+        needs_padding = height < self.size or width < self.size
+        padding = [0, 0, max(self.size - width, 0), max(self.size - height, 0)] if needs_padding else None
         return dict(padding=padding, needs_padding=needs_padding)
 
     def _transform(self, inpt, params):
@@ -551,7 +610,7 @@ class TestRefSegTransforms:
         conv_fns = []
         if supports_pil:
             conv_fns.append(to_pil_image)
-        conv_fns.extend([torch.Tensor, lambda x: x])
+        conv_fns.extend([lambda x: x.as_subclass(torch.Tensor), lambda x: x])
 
         for conv_fn in conv_fns:
             tv_tensor_image = make_image(size=size, color_space="RGB", dtype=image_dtype)
@@ -579,26 +638,29 @@ class TestRefSegTransforms:
             expected_image, expected_mask = t_ref(*dp_ref)
             if isinstance(actual_image, torch.Tensor) and not isinstance(expected_image, torch.Tensor):
                 expected_image = legacy_F.pil_to_tensor(expected_image)
-            expected_mask = legacy_F.pil_to_tensor(expected_mask).squeeze(0)
+            # np.asarray would avoid the copy, but returns a read-only array that torch.from_numpy warns about
+            expected_mask = torch.from_numpy(np.array(expected_mask))
             expected = (expected_image, expected_mask)
 
             assert_equal(actual, expected)
 
     @pytest.mark.parametrize(
-        ("t_ref", "t", "data_kwargs"),
+        ("make_t_ref", "t", "data_kwargs"),
         [
-            (
-                seg_transforms.RandomHorizontalFlip(flip_prob=1.0),
+            pytest.param(
+                lambda ref: ref.RandomHorizontalFlip(flip_prob=1.0),
                 v2_transforms.RandomHorizontalFlip(p=1.0),
                 dict(),
+                id="RandomHorizontalFlip-p1",
             ),
-            (
-                seg_transforms.RandomHorizontalFlip(flip_prob=0.0),
+            pytest.param(
+                lambda ref: ref.RandomHorizontalFlip(flip_prob=0.0),
                 v2_transforms.RandomHorizontalFlip(p=0.0),
                 dict(),
+                id="RandomHorizontalFlip-p0",
             ),
-            (
-                seg_transforms.RandomCrop(size=480),
+            pytest.param(
+                lambda ref: ref.RandomCrop(size=480),
                 v2_transforms.Compose(
                     [
                         PadIfSmaller(size=480, fill={tv_tensors.Mask: 255, "others": 0}),
@@ -606,16 +668,18 @@ class TestRefSegTransforms:
                     ]
                 ),
                 dict(),
+                id="RandomCrop",
             ),
-            (
-                seg_transforms.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
+            pytest.param(
+                lambda ref: ref.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
                 v2_transforms.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
                 dict(supports_pil=False, image_dtype=torch.float),
+                id="Normalize",
             ),
         ],
     )
-    def test_common(self, t_ref, t, data_kwargs):
-        self.check(t, t_ref, data_kwargs)
+    def test_common(self, seg_transforms, make_t_ref, t, data_kwargs):
+        self.check(t, make_t_ref(seg_transforms), data_kwargs)
 
 
 @pytest.mark.parametrize(
@@ -634,8 +698,7 @@ class TestRefSegTransforms:
     ],
 )
 def test_dispatcher_signature_consistency(legacy_dispatcher, name_only_params):
-    legacy_signature = inspect.signature(legacy_dispatcher)
-    legacy_params = list(legacy_signature.parameters.values())[1:]
+    legacy_params = [param for _, param in get_signature_params(legacy_dispatcher)][1:]
 
     try:
         prototype_dispatcher = getattr(prototype_F, legacy_dispatcher.__name__)
@@ -644,8 +707,7 @@ def test_dispatcher_signature_consistency(legacy_dispatcher, name_only_params):
             f"Legacy dispatcher `F.{legacy_dispatcher.__name__}` has no prototype equivalent"
         ) from None
 
-    prototype_signature = inspect.signature(prototype_dispatcher)
-    prototype_params = list(prototype_signature.parameters.values())[1:]
+    prototype_params = [param for _, param in get_signature_params(prototype_dispatcher)][1:]
 
     # Some dispatchers got extra parameters. This makes sure they have a default argument and thus are BC. We don't
     # need to check if parameters were added in the middle rather than at the end, since that will be caught by the
@@ -658,12 +720,17 @@ def test_dispatcher_signature_consistency(legacy_dispatcher, name_only_params):
         assert param.default is not param.empty
 
     # Some annotations were changed mostly to supersets of what was there before. Plus, some legacy dispatchers had no
-    # annotations. In these cases we simply drop the annotation and default argument from the comparison
-    for prototype_param, legacy_param in zip(prototype_params, legacy_params):
+    # annotations. In these cases we simply drop the annotation and default argument from the comparison. Since the
+    # parameters are cached by get_signature_params, we replace them rather than modifying them in-place.
+    for idx, (prototype_param, legacy_param) in enumerate(zip(prototype_params, legacy_params)):
         if legacy_param.name in name_only_params:
-            prototype_param._annotation = prototype_param._default = inspect.Parameter.empty
-            legacy_param._annotation = legacy_param._default = inspect.Parameter.empty
+            prototype_params[idx] = prototype_param.replace(
+                annotation=inspect.Parameter.empty, default=inspect.Parameter.empty
+            )
+            legacy_params[idx] = legacy_param.replace(
+                annotation=inspect.Parameter.empty, default=inspect.Parameter.empty
+            )
         elif legacy_param.annotation is inspect.Parameter.empty:
-            prototype_param._annotation = inspect.Parameter.empty
+            prototype_params[idx] = prototype_param.replace(annotation=inspect.Parameter.empty)
 
     assert prototype_params == legacy_params